@@ -10,4 +10,5 @@ MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
 See the Mulan PSL v2 for more details.
 """
 from .main import *
-from . import compare
\ No newline at end of file
+from . import compare
+from . import cache
\ No newline at end of file
@@ -0,0 +1,215 @@
+"""
+Copyright (c) 2023 Gou Haoming
+doFolder is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+"""
+import sqlite3
+import threading
+import time
+from typing import Dict, Tuple, Union
+
+__all__ = [
+    "FileHashCacheManager",
+    "MemoryFileHashCacheManager",
+    "SqliteFileHashCacheManager",
+]
+
+
+class FileHashCacheManager:
+    """
+    The interface of the hash caches used by `File.getHash`.
+
+    An entry is only valid for the size and modification time the file had when it was hashed.
+    """
+
+    def get(
+        self, path: str, algorithm: str, size: int, mtimeNs: int
+    ) -> Union[str, None]:
+        """
+        Look up a cached hash.
+
+        Args:
+            path (str): The path of the file.
+            algorithm (str): The name of the hash algorithm.
+            size (int): The current size of the file.
+            mtimeNs (int): The current modification time of the file in nanoseconds.
+
+        Returns:
+            Union[str, None]: The cached hash, or None if there is no valid entry.
+        """
+        raise NotImplementedError()
+
+    def set(
+        self, path: str, algorithm: str, size: int, mtimeNs: int, hash: str
+    ) -> None:
+        """
+        Store a calculated hash.
+
+        Args:
+            path (str): The path of the file.
+            algorithm (str): The name of the hash algorithm.
+            size (int): The size of the file when it was hashed.
+            mtimeNs (int): The modification time of the file in nanoseconds when it was hashed.
+            hash (str): The hash of the file.
+        """
+        raise NotImplementedError()
+
+    def setMany(
+        self, path: str, size: int, mtimeNs: int, hashes: Dict[str, str]
+    ) -> None:
+        """
+        Store several hashes of one file. Backends that write to disk should do it in one transaction.
+
+        Args:
+            path (str): The path of the file.
+            size (int): The size of the file when it was hashed.
+            mtimeNs (int): The modification time of the file in nanoseconds when it was hashed.
+            hashes (Dict[str, str]): The hashes indexed by algorithm.
+        """
+        for algorithm, hash in hashes.items():
+            self.set(path, algorithm, size, mtimeNs, hash)
+
+
+class MemoryFileHashCacheManager(FileHashCacheManager):
+    """
+    A hash cache kept in memory, dropping the least recently used entries once it is full.
+    """
+
+    def __init__(self, maxSize: int = 100000):
+        """
+        Args:
+            maxSize (int, optional): How many hashes are kept at most. Defaults to 100000.
+        """
+        self._lock = threading.Lock()
+        self.maxSize = maxSize
+        # plain dicts keep insertion order, so the first key is always the least recently used one
+        # the digests are kept as raw bytes, half the size of their hexadecimal form
+        self._cache: Dict[Tuple[str, str], Tuple[int, int, bytes]] = {}
+
+    def get(
+        self, path: str, algorithm: str, size: int, mtimeNs: int
+    ) -> Union[str, None]:
+        key = (path, algorithm)
+        with self._lock:
+            entry = self._cache.pop(key, None)
+            if entry is None or entry[0] != size or entry[1] != mtimeNs:
+                return None
+            self._cache[key] = entry
+        return entry[2].hex()
+
+    def set(
+        self, path: str, algorithm: str, size: int, mtimeNs: int, hash: str
+    ) -> None:
+        key = (path, algorithm)
+        entry = (size, mtimeNs, bytes.fromhex(hash))
+        with self._lock:
+            self._cache.pop(key, None)
+            self._cache[key] = entry
+            if len(self._cache) > self.maxSize:
+                del self._cache[next(iter(self._cache))]
+
+    def setMany(
+        self, path: str, size: int, mtimeNs: int, hashes: Dict[str, str]
+    ) -> None:
+        entries = [
+            ((path, algorithm), (size, mtimeNs, bytes.fromhex(hash)))
+            for algorithm, hash in hashes.items()
+        ]
+        with self._lock:
+            for key, entry in entries:
+                self._cache.pop(key, None)
+                self._cache[key] = entry
+            while len(self._cache) > self.maxSize:
+                del self._cache[next(iter(self._cache))]
+
+
+class SqliteFileHashCacheManager(FileHashCacheManager):
+    """
+    A hash cache kept in a SQLite database, so hashes survive between runs. The digests are stored as raw bytes.
+    """
+
+    def __init__(
+        self, database: str, negativeCacheSize: int = 10000, configVersion: int = 0
+    ):
+        """
+        Args:
+            database (str): The path of the database file. It is created if it does not exist.
+            negativeCacheSize (int, optional): How many recently missing entries are remembered, so looking them up again does not query the database. Defaults to 10000.
+            configVersion (int, optional): A version of whatever the cached hashes depend on besides the file. Opening the database with another version drops all entries. Defaults to 0.
+        """
+        self._lock = threading.Lock()
+        self.negativeCacheSize = negativeCacheSize
+        self._missing: Dict[Tuple[str, str], None] = {}
+        self._connection = sqlite3.connect(database, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            "path TEXT NOT NULL, algorithm TEXT NOT NULL, size INTEGER NOT NULL, "
+            "mtimeNs INTEGER NOT NULL, hash BLOB NOT NULL, cachedAt REAL NOT NULL, "
+            "PRIMARY KEY (path, algorithm))"
+        )
+        # the version is kept in the header of the database, checking it costs nothing per lookup
+        storedVersion = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        if storedVersion != configVersion:
+            self._connection.execute("DELETE FROM hashes")
+            self._connection.execute(f"PRAGMA user_version = {int(configVersion)}")
+        self._connection.commit()
+
+    def get(
+        self, path: str, algorithm: str, size: int, mtimeNs: int
+    ) -> Union[str, None]:
+        key = (path, algorithm)
+        with self._lock:
+            if key in self._missing:
+                return None
+            row = self._connection.execute(
+                "SELECT size, mtimeNs, hash FROM hashes WHERE path = ? AND algorithm = ?",
+                (path, algorithm),
+            ).fetchone()
+            if row is None or row[0] != size or row[1] != mtimeNs:
+                self._missing[key] = None
+                if len(self._missing) > self.negativeCacheSize:
+                    del self._missing[next(iter(self._missing))]
+                return None
+        return row[2].hex()
+
+    def set(
+        self, path: str, algorithm: str, size: int, mtimeNs: int, hash: str
+    ) -> None:
+        with self._lock:
+            self._missing.pop((path, algorithm), None)
+            self._connection.execute(
+                "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)",
+                (path, algorithm, size, mtimeNs, bytes.fromhex(hash), time.time()),
+            )
+            self._connection.commit()
+
+    def setMany(
+        self, path: str, size: int, mtimeNs: int, hashes: Dict[str, str]
+    ) -> None:
+        cachedAt = time.time()
+        with self._lock:
+            for algorithm in hashes:
+                self._missing.pop((path, algorithm), None)
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (path, algorithm, size, mtimeNs, bytes.fromhex(hash), cachedAt)
+                    for algorithm, hash in hashes.items()
+                ],
+            )
+            self._connection.commit()
+
+    def close(self) -> None:
+        """
+        Close the database.
+        """
+        with self._lock:
+            self._connection.close()
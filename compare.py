@@ -10,15 +10,15 @@ MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
 See the Mulan PSL v2 for more details.
 """
 import doFolder.main as doFolder
-from typing import Literal,List,Union,Callable,Dict
+from typing import Literal,List,Union,Callable,Dict,Tuple
 from concurrent.futures import ThreadPoolExecutor,_base
-import time
 class RepeatedExecutionError(Exception):
     def __init__(self,message:str):
         self.message=message
     def __str__(self):
         return self.message
 class FileMissing(doFolder._HasName):
+    __slots__=("file","root","anotherFolder","statue")
     def __init__(self,file:doFolder.File,root:doFolder.Folder,anotherFolder:doFolder.Folder):
         self.file = file
         self.root = root
@@ -46,6 +46,7 @@ class FileMissing(doFolder._HasName):
     def __repr__(self) -> str:
         return self.__str__()
 class FolderMissing(doFolder._HasName):
+    __slots__=("folder","root","anotherFolder","statue")
     def __init__(self,folder:doFolder.Folder,root:doFolder.Folder,anotherFolder:doFolder.Folder):
         self.folder = folder
         self.root = root
@@ -73,6 +74,7 @@ class FolderMissing(doFolder._HasName):
     def __repr__(self) -> str:
         return self.__str__()
 class FileDifferent(doFolder._HasName):
+    __slots__=("file1","file2","root1","root2","statue")
     def __init__(self,file1:doFolder.File,file2:doFolder.File,root1:doFolder.Folder,root2:doFolder.Folder):
         self.file1 = file1
         self.file2 = file2
@@ -115,6 +117,12 @@ class CompareResult(doFolder._HasName):
         self._folderMissingList:doFolder._ObjectListIndexedByName[FolderMissing]=doFolder._ObjectListIndexedByName(var=[])
         self._fileDifferentList:doFolder._ObjectListIndexedByName[FileDifferent]=doFolder._ObjectListIndexedByName(var=[])
         self._FolderDifferentList:doFolder._ObjectListIndexedByName[CompareResult]=doFolder._ObjectListIndexedByName(var=[])
+        self._differentLists:Dict[type,doFolder._ObjectListIndexedByName]={
+            FileMissing:self._fileMissingList,
+            FolderMissing:self._folderMissingList,
+            FileDifferent:self._fileDifferentList,
+            CompareResult:self._FolderDifferentList,
+        }
         self.cacheFileMissingList:Union[List[FileMissing],None]=None
         self.cacheFileDifferentList:Union[List[FileDifferent],None]=None
         self.cacheFolderMissingList:Union[List[FolderMissing],None]=None
@@ -122,14 +130,9 @@ class CompareResult(doFolder._HasName):
     def name(self)->str:
         return self.folder1.name
     def newDifferent(self,different:Union[FileMissing,FolderMissing,FileDifferent,"CompareResult"]) -> None:
-        if type(different) is FileMissing:
-            self._fileMissingList.append(different)
-        elif type(different) is FolderMissing:
-            self._folderMissingList.append(different)
-        elif type(different) is FileDifferent:
-            self._fileDifferentList.append(different)
-        elif type(different) is CompareResult:
-            self._FolderDifferentList.append(different)
+        target=self._differentLists.get(type(different))
+        if target is not None:
+            target.append(different)
     def __str__(self):
         return f"<CompareResult between {self.folder1} and {self.folder2}>"
     def __repr__(self):
@@ -158,49 +161,104 @@ class CompareResult(doFolder._HasName):
     @property
     def differentList(self)->List[Union[FileMissing,FolderMissing,FileDifferent]]:
         return self.fileMissingList+self.folderMissingList+self.fileDifferentList
+DEFAULT_BATCH_SIZE=64
+INLINE_COMPARE_SIZE=64*1024
+_METADATA_COMPARE_CONTENTS={"ignore","size"}
+def _readFull(f,view:memoryview)->int:
+    """
+    Fill the buffer unless the end of the file is reached, so a short read does not misalign the two files being compared
+    """
+    size=0
+    while size<len(view):
+        read=f.readinto(view[size:])
+        if not read:
+            break
+        size+=read
+    return size
+def _sameContent(file1:doFolder.File,file2:doFolder.File,chunkSize:int=doFolder.DEFAULT_CHUNK_SIZE)->bool:
+    """
+    Compare the contents of two files chunk by chunk, reading into two reused buffers, and stop at the first different chunk
+    """
+    if file1.size!=file2.size:
+        return False
+    # a small file needs one small read, not two default-sized buffers
+    chunkSize=min(chunkSize,file1.size+1)
+    buffer1,buffer2=bytearray(chunkSize),bytearray(chunkSize)
+    view1,view2=memoryview(buffer1),memoryview(buffer2)
+    with open(str(file1.path),"rb",buffering=0) as f1,open(str(file2.path),"rb",buffering=0) as f2:
+        while True:
+            size1=_readFull(f1,view1)
+            size2=_readFull(f2,view2)
+            if size1!=size2:
+                return False
+            if not size1:
+                return True
+            if size1==chunkSize:
+                # bytearray comparison is a memcmp, a memoryview one goes element by element
+                if buffer1!=buffer2:
+                    return False
+            elif buffer1[:size1]!=buffer2[:size2]:# the last chunk, the copies cost less than a memoryview comparison
+                return False
 formatedCompareContent=Callable[[doFolder.File,doFolder.File],bool]
-unformatedCompareContent=Union[Literal["ignore","md5","sha1","sha256","sha512","hash","content","size"],formatedCompareContent]
+unformatedCompareContent=Union[Literal["ignore","md5","sha1","sha256","sha512","blake2b","xxh3_64","xxh3_128","blake3","hash","content","size"],formatedCompareContent]
+_compareContents:Dict[str,formatedCompareContent]={
+    "ignore":lambda f1,f2:True,
+    "hash":lambda f1,f2:f1.hash==f2.hash,
+    "sha1":lambda f1,f2:f1.sha1==f2.sha1,
+    "sha256":lambda f1,f2:f1.sha256==f2.sha256,
+    "sha512":lambda f1,f2:f1.sha512==f2.sha512,
+    "md5":lambda f1,f2:f1.md5==f2.md5,
+    "blake2b":lambda f1,f2:f1.getHash("blake2b")==f2.getHash("blake2b"),
+    "xxh3_64":lambda f1,f2:f1.getHash("xxh3_64")==f2.getHash("xxh3_64"),
+    "xxh3_128":lambda f1,f2:f1.getHash("xxh3_128")==f2.getHash("xxh3_128"),
+    "blake3":lambda f1,f2:f1.getHash("blake3")==f2.getHash("blake3"),
+    "size":lambda f1,f2:f1.size==f2.size,
+    "content":lambda f1,f2:_sameContent(f1,f2),
+}
 def _normalizedCompareContent(compareContent:unformatedCompareContent)->formatedCompareContent:
     if callable(compareContent):
         return compareContent
     elif type(compareContent)==str:
-        ma:Dict[str,formatedCompareContent]={
-            "ignore":lambda f1,f2:True,
-            "hash":lambda f1,f2:f1.hash==f2.hash,
-            "sha1":lambda f1,f2:f1.sha1==f2.sha1,
-            "sha256":lambda f1,f2:f1.sha256==f2.sha256,
-            "sha512":lambda f1,f2:f1.sha512==f2.sha512,
-            "md5":lambda f1,f2:f1.md5==f2.md5,
-            "size":lambda f1,f2:f1.size==f2.size,
-            "content":lambda f1,f2:f1.content==f2.content,
-        }
-        if compareContent in ma:
-            return ma[compareContent]
+        if compareContent in _compareContents:
+            return _compareContents[compareContent]
         raise ValueError(f"compareContent is not valid. If you want to customize the comparison method, please pass in a comparison function")
     raise ValueError(f"compareContent must be callable or str,but \"{compareContent}\" is given")
-def compare(folder1:doFolder.Folder,folder2:doFolder.Folder,compareContent:unformatedCompareContent="ignore",threaded:bool=False,threads:Union[None,int]=10)->CompareResult:
-    threadPool=ThreadPoolExecutor(max_workers=threads) if threaded else None
+def compare(folder1:doFolder.Folder,folder2:doFolder.Folder,compareContent:unformatedCompareContent="ignore",threaded:bool=False,threads:Union[None,int]=None,batchSize:int=DEFAULT_BATCH_SIZE,adaptiveThreads:bool=True)->CompareResult:
+    """
+    Compare two folders
+    :param threads: maximum number of threads, defaults to doFolder.defaultThreadNum of folder1: 2 on a spinning disk, otherwise the number of CPUs. Raise it for network storage
+    :param batchSize: number of file pairs compared by one threaded task
+    :param adaptiveThreads: compare files smaller than INLINE_COMPARE_SIZE in the scanning thread instead of the thread pool
+    """
+    threadPool=ThreadPoolExecutor(max_workers=threads or doFolder.defaultThreadNum(str(folder1.path))) if threaded else None
     waitlist:List[_base.Future]=[]
-    result=_compare(folder1,folder2,folder1,folder2,_normalizedCompareContent(compareContent),threadPool,None,waitlist)
-    for i in waitlist:
-        while not i.done():
-            time.sleep(0.1)
+    if isinstance(compareContent,str) and compareContent in _METADATA_COMPARE_CONTENTS:
+        inlineSize=float("inf")# the result is known without reading the files, a Future would only wrap it
+    else:
+        inlineSize=INLINE_COMPARE_SIZE if adaptiveThreads else 0
+    result=_compare(folder1,folder2,folder1,folder2,_normalizedCompareContent(compareContent),threadPool,None,waitlist,batchSize,inlineSize)
+    for i in waitlist:# grows while subfolders are dispatched, block on each instead of polling
+        i.result()
     return result
 def _compareFile(result:CompareResult,file1:doFolder.File,file2:doFolder.File,compareContent:formatedCompareContent,root1:doFolder.Folder
             ,root2:doFolder.Folder)->None:
     if not compareContent(file1,file2):
         result.newDifferent(FileDifferent(file1,file2,root1,root2))
+def _compareFiles(result:CompareResult,pairs:List[Tuple[doFolder.File,doFolder.File]],compareContent:formatedCompareContent,root1:doFolder.Folder
+            ,root2:doFolder.Folder)->None:
+    for file1,file2 in pairs:
+        _compareFile(result,file1,file2,compareContent,root1,root2)
 def _compare(folder1:doFolder.Folder,folder2:doFolder.Folder,root1:doFolder.Folder
             ,root2:doFolder.Folder,compareContent:formatedCompareContent,threadPool:Union[ThreadPoolExecutor,None]=None,parent:Union[CompareResult,None]=None,
-            waitlist:List[_base.Future]=[])->CompareResult:
+            waitlist:List[_base.Future]=[],batchSize:int=DEFAULT_BATCH_SIZE,inlineSize:float=INLINE_COMPARE_SIZE)->CompareResult:
     result=CompareResult(folder1,folder2)
+    pairs:List[Tuple[doFolder.File,doFolder.File]]=[]
     for file1 in folder1.files:
         file2=folder2.files[file1.name]
         if file2==None:
             result.newDifferent(FileMissing(file1,root1,root2))
         else:
-            if threadPool:threadPool.submit(_compareFile,result,file1,file2,compareContent,root1,root2)
-            else:_compareFile(result,file1,file2,compareContent,root1,root2)
+            pairs.append((file1,file2))
     for file2 in folder2.files:
         file1=folder1.files[file2.name]
         if file1==None:
@@ -210,12 +268,26 @@ def _compare(folder1:doFolder.Folder,folder2:doFolder.Folder,root1:doFolder.Fold
         if subfolder2==None:
             result.newDifferent(FolderMissing(subfolder1,root1,root2))
         else:
-            if threadPool:waitlist.append(threadPool.submit(_compare,subfolder1,subfolder2,root1,root2,compareContent,threadPool,result,waitlist))
-            else:_compare(subfolder1,subfolder2,root1,root2,compareContent,threadPool,result,waitlist)
+            if threadPool:waitlist.append(threadPool.submit(_compare,subfolder1,subfolder2,root1,root2,compareContent,threadPool,result,waitlist,batchSize,inlineSize))
+            else:_compare(subfolder1,subfolder2,root1,root2,compareContent,threadPool,result,waitlist,batchSize,inlineSize)
     for subfolder2 in folder2.subfolder:
         subfolder1=folder1.subfolder[subfolder2.name]
         if subfolder1==None:
             result.newDifferent(FolderMissing(subfolder2,root2,root1))
+    if threadPool and inlineSize:
+        _compareFiles(result,[i for i in pairs if i[0].size<inlineSize and i[1].size<inlineSize],compareContent,root1,root2)
+        pairs=[i for i in pairs if i[0].size>=inlineSize or i[1].size>=inlineSize]
+    if threadPool and any(i[0].size>=inlineSize or i[1].size>=inlineSize for i in pairs):
+        # only small pairs are batched by count, a large pair is worth a task of its own so large files run in parallel
+        small=[i for i in pairs if i[0].size<INLINE_COMPARE_SIZE and i[1].size<INLINE_COMPARE_SIZE]
+        for i in range(0,len(small),batchSize):
+            waitlist.append(threadPool.submit(_compareFiles,result,small[i:i+batchSize],compareContent,root1,root2))
+        for i in pairs:
+            if i[0].size>=INLINE_COMPARE_SIZE or i[1].size>=INLINE_COMPARE_SIZE:
+                waitlist.append(threadPool.submit(_compareFile,result,i[0],i[1],compareContent,root1,root2))
+    else:
+        # Nothing here is large enough to be worth a thread: do it in this thread
+        _compareFiles(result,pairs,compareContent,root1,root2)
     if parent:
         parent.newDifferent(result)
     return result
\ No newline at end of file
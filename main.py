@@ -25,6 +25,7 @@ from typing import (
     Dict,
     overload,
     Set,
+    Sequence,
 )
 import shutil
 import copy
@@ -37,16 +38,57 @@ from watchdog.events import (
     EVENT_TYPE_DELETED,
     EVENT_TYPE_MODIFIED,
 )
+import asyncio
+import sys
+import threading
 import hashlib
+import mmap
 import logging
 from concurrent.futures import ThreadPoolExecutor
 from specialStr import Path
 import base64
 import json
-from concurrent.futures import ThreadPoolExecutor, _base
-import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, _base
+from doFolder.cache import FileHashCacheManager
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+
+def _cpuHasShaExtensions() -> bool:
+    """
+    Whether the CPU computes SHA-256 in hardware (SHA-NI on x86, the SHA2 extension on ARM). It is read from /proc/cpuinfo, so it is only detected on Linux.
+    """
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith(("flags", "Features")):
+                    flags = line.partition(":")[2].split()
+                    return "sha_ni" in flags or "sha2" in flags
+    except OSError:
+        pass
+    return False
+
+
+# OpenSSL's SHA-256 on SHA extensions outruns BLAKE2b, but BLAKE3 is faster still
+DEFAULT_HASH_ALGORITHM = (
+    "blake3" if blake3 else "sha256" if _cpuHasShaExtensions() else "blake2b"
+)
 
-__all__ = ["File", "Folder", "Path"]
+__all__ = [
+    "File",
+    "Folder",
+    "Path",
+    "hashFiles",
+    "hashFilesInProcesses",
+    "defaultThreadNum",
+]
 
 EVENT_TYPES = Literal["created", "deleted", "modified"]
 
@@ -57,6 +99,9 @@ FormatedMatching = Tuple[
 UnformattedMatching = Union[
     SearchCondition, Tuple[SearchCondition, int, Union[int, None]]
 ]
+DEFAULT_CHUNK_SIZE = 1 << 20
+MMAP_MIN_SIZE = 1 << 22
+PARALLEL_HASH_MIN_SIZE = 1 << 26
 _T = TypeVar("_T", bound="_HasName")
 _U = TypeVar("_U")
 
@@ -78,6 +123,352 @@ class UnknownError(Exception):
         )
 
 
+_hashConstructors: Dict[str, Callable[[], Any]] = {}
+# the hashes only detect changes, so FIPS builds of OpenSSL may serve md5 or sha1 too (Python 3.9+)
+_HASHLIB_OPTIONS: Dict[str, Any] = (
+    {"usedforsecurity": False} if sys.version_info >= (3, 9) else {}
+)
+
+
+def _resolveHashConstructor(algorithm: str) -> Callable[[], Any]:
+    """
+    Find the function creating hash objects for the given algorithm.
+    """
+    if algorithm in ("xxh3_64", "xxh3_128"):
+        if xxhash is None:
+            raise ValueError(f'The "xxhash" package is required for "{algorithm}"')
+        return getattr(xxhash, algorithm)
+    if algorithm == "blake3":
+        if blake3 is None:
+            raise ValueError(f'The "blake3" package is required for "{algorithm}"')
+        return blake3.blake3
+    # copying an empty hash object is about three times cheaper than constructing one,
+    # it skips the name lookup and the digest fetch of OpenSSL
+    hashObject = hashlib.new(algorithm, **_HASHLIB_OPTIONS)
+    if not hashObject.digest_size:
+        # SHAKE has no fixed digest length, hexdigest() would need one
+        raise ValueError(
+            f'"{algorithm}" has a variable digest length and is not supported'
+        )
+    return hashObject.copy
+
+
+def _newHashObject(algorithm: str) -> Any:
+    """
+    Create a hash object for the given algorithm.
+
+    Besides everything `hashlib.new` accepts except the variable-length SHAKE algorithms, "xxh3_64" and "xxh3_128" are served by the `xxhash` package and "blake3" by the `blake3` package when they are installed. The constructor of each algorithm is only looked up once.
+    """
+    constructor = _hashConstructors.get(algorithm)
+    if constructor is not None:
+        return constructor()
+    constructor = _resolveHashConstructor(algorithm)
+    hashObject = constructor()
+    # only remember algorithms that actually work
+    _hashConstructors[algorithm] = constructor
+    return hashObject
+
+
+def _checkAlgorithms(algorithms: Iterable[str]) -> None:
+    """
+    Resolves the constructors of the algorithms once, so an unsupported name raises before any file is touched.
+    """
+    for algorithm in algorithms:
+        if algorithm not in _hashConstructors:
+            _newHashObject(algorithm)
+
+
+_emptyDigests: Dict[str, str] = {}
+
+
+def _emptyDigest(algorithm: str) -> str:
+    """
+    Returns the hash of empty content, which is the same for every empty file.
+    """
+    digest = _emptyDigests.get(algorithm)
+    if digest is None:
+        digest = _emptyDigests[algorithm] = _newHashObject(algorithm).hexdigest()
+    return digest
+
+
+def _hashPath(
+    path: str, algorithms: List[str], chunkSize: int, dropCache: bool = False
+) -> Tuple[Dict[str, str], int, int]:
+    """
+    Calculates the hashes of a file in one pass. It only takes plain values, so it can run in another process.
+
+    Returns:
+        Tuple[Dict[str, str], int, int]: The hashes, and the size and modification time (ns) of the file that was read, which may differ from an earlier scan.
+    """
+    chunkSize = max(chunkSize, 64 * 1024)
+    with open(_openForReading(path), "rb", buffering=0) as f:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        stat = os.fstat(f.fileno())
+        size = stat.st_size
+        head = b""
+        if not size:
+            # pseudo-files (e.g. in /proc) report a size of 0 but have content, so only a read proves the file is empty
+            head = f.read(1)
+            if not head:
+                return {i: _emptyDigest(i) for i in algorithms}, 0, stat.st_mtime_ns
+        hashObjects = {i: _newHashObject(i) for i in algorithms}
+        blockSize = getattr(stat, "st_blksize", 0)
+        if blockSize > 0:
+            # keep reads aligned to the block size the filesystem prefers
+            chunkSize = -(-chunkSize // blockSize) * blockSize
+        if (
+            blake3 is not None
+            and "blake3" in hashObjects
+            and size >= PARALLEL_HASH_MIN_SIZE
+        ):
+            # BLAKE3 is a tree hash, so it can split a large file across threads and still give the same digest
+            hashObjects["blake3"] = blake3.blake3(max_threads=blake3.blake3.AUTO)
+        if head:
+            for hashObject in hashObjects.values():
+                hashObject.update(head)
+            _hashStream(f, hashObjects, chunkSize)
+        elif size < MMAP_MIN_SIZE or not _hashMapped(f, size, hashObjects, chunkSize):
+            _hashStream(f, hashObjects, min(chunkSize, size + 1))
+        if dropCache and hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+    return (
+        {i: hashObjects[i].hexdigest() for i in hashObjects},
+        size,
+        stat.st_mtime_ns,
+    )
+
+
+def _hashStream(f: IO[bytes], hashObjects: Dict[str, Any], chunkSize: int) -> None:
+    """
+    Feeds a file to the hash objects by reading it chunk by chunk. Small files pass a smaller chunk size, so they do not allocate a whole default-sized buffer.
+    """
+    buffer = bytearray(chunkSize)
+    view = memoryview(buffer)
+    while True:
+        size = f.readinto(buffer)
+        if not size:
+            break
+        chunk = view[:size]
+        for hashObject in hashObjects.values():
+            hashObject.update(chunk)
+
+
+def _hashMapped(
+    f: IO[bytes], size: int, hashObjects: Dict[str, Any], chunkSize: int
+) -> bool:
+    """
+    Feeds a file to the hash objects through a memory map, so the hash functions read the page cache directly without copies. A single algorithm gets the whole file in one call; several algorithms take it window by window to share the pages while they are hot, or each in its own thread from PARALLEL_HASH_MIN_SIZE on.
+
+    Returns:
+        bool: False if the file cannot be mapped (e.g. too big for the address space), nothing is hashed then.
+    """
+    try:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError, OverflowError):
+        return False
+    with mapped:
+        if hasattr(mmap, "MADV_SEQUENTIAL"):
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+        if len(hashObjects) == 1:
+            next(iter(hashObjects.values())).update(mapped)
+            return True
+        if size >= PARALLEL_HASH_MIN_SIZE:
+            # hashing a large buffer releases the GIL, so each algorithm gets a core
+            with ThreadPoolExecutor(max_workers=len(hashObjects)) as pool:
+                for future in [
+                    pool.submit(hashObject.update, mapped)
+                    for hashObject in hashObjects.values()
+                ]:
+                    future.result()
+            return True
+        with memoryview(mapped) as view:
+            # the file may have grown since the fstat, hash what is mapped like the single-algorithm path does
+            for start in range(0, len(mapped), chunkSize):
+                with view[start : start + chunkSize] as chunk:
+                    for hashObject in hashObjects.values():
+                        hashObject.update(chunk)
+    return True
+
+
+def _openForReading(path: str) -> int:
+    """
+    Opens a file for reading and returns the descriptor. Where possible the access time is not updated (O_NOATIME), which saves a metadata write per file when hashing big trees. O_NOATIME is only allowed for the owner of the file, so it is dropped if the system refuses it.
+    """
+    flags = os.O_RDONLY | getattr(os, "O_BINARY", 0)
+    noatime = getattr(os, "O_NOATIME", 0)
+    if noatime:
+        try:
+            return os.open(path, flags | noatime)
+        except PermissionError:
+            pass
+    return os.open(path, flags)
+
+
+def _isRotational(path: str) -> bool:
+    """
+    Whether the path is stored on a spinning disk. It is read from /sys, so it is only detected on Linux.
+    """
+    try:
+        dev = os.stat(path).st_dev
+        device = f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}"
+        # a whole disk has its own queue, a partition uses the one of its disk
+        for queue in (f"{device}/queue", f"{device}/../queue"):
+            if os.path.exists(queue):
+                with open(f"{queue}/rotational") as f:
+                    return f.read().strip() == "1"
+    except (OSError, AttributeError):
+        pass
+    return False
+
+
+def defaultThreadNum(path: str) -> int:
+    """
+    Returns a suitable number of threads to read and hash files under the given path: 2 on a spinning disk, where more threads only add seeks, otherwise the number of CPUs.
+
+    Args:
+        path (str): A path on the storage that will be read.
+
+    Returns:
+        int: The number of threads.
+    """
+    if _isRotational(path):
+        return 2
+    return os.cpu_count() or 1
+
+
+def _hashFileBatch(
+    batch: List[Tuple["File", List[str]]], chunkSize: int, dropCache: bool = False
+) -> None:
+    for file, algorithms in batch:
+        with file._hashLock:
+            # getHash may have hashed the file since it was scheduled
+            missing = file._missingHashes(algorithms)
+            if missing:
+                file._storeHashes(
+                    *_hashPath(file._pathStr, missing, chunkSize, dropCache)
+                )
+
+
+def _scheduleBatches(
+    misses: List[Tuple["File", List[str]]], batchSize: int
+) -> List[List[Tuple["File", List[str]]]]:
+    """
+    Splits the files to hash into tasks, largest first, so a big file picked up last does not keep one worker busy long after the others are done. Files of at least MMAP_MIN_SIZE get a task of their own, the rest are grouped `batchSize` files per task.
+    """
+    misses = sorted(misses, key=lambda i: i[0].size, reverse=True)
+    large = 0
+    while large < len(misses) and misses[large][0].size >= MMAP_MIN_SIZE:
+        large += 1
+    return [misses[i : i + 1] for i in range(large)] + [
+        misses[i : i + batchSize] for i in range(large, len(misses), batchSize)
+    ]
+
+
+def hashFiles(
+    files: Iterable["File"],
+    algorithms: Sequence[str],
+    threads: Union[int, None] = None,
+    batchSize: int = 64,
+    chunkSize: int = DEFAULT_CHUNK_SIZE,
+    dropCache: bool = False,
+) -> List[Dict[str, str]]:
+    """
+    Calculates the hashes of many files with a thread pool.
+
+    The caches of all files are checked in the calling thread first. Only the files that still need hashing are submitted, largest first. Small files go `batchSize` files per task, which saves the per-task overhead of the pool; large files get a task each, so none of them is left running alone at the end.
+
+    Args:
+        files (Iterable[File]): The files to hash.
+        algorithms (Sequence[str]): The names of the hash algorithms, see `File.getHash`.
+        threads (Union[int, None], optional): The number of worker threads. Defaults to None, which means `defaultThreadNum` of the first file to hash.
+        batchSize (int, optional): The number of files hashed by one task. Defaults to 64.
+        chunkSize (int, optional): The size of each read. Defaults to DEFAULT_CHUNK_SIZE.
+        dropCache (bool, optional): Drop each file from the page cache after hashing it, see `File.getHash`. Hashing a whole tree once then does not evict hotter data. Defaults to False.
+
+    Returns:
+        List[Dict[str, str]]: The hashes of each file, in the order of `files`.
+    """
+    files = list(files)
+    _checkAlgorithms(algorithms)
+    misses: List[Tuple[File, List[str]]] = []
+    for file in files:
+        missing = file._missingHashes(algorithms)
+        if missing:
+            misses.append((file, missing))
+    if misses:
+        if not threads:
+            threads = defaultThreadNum(misses[0][0]._pathStr)
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            waitlist = [
+                pool.submit(_hashFileBatch, batch, chunkSize, dropCache)
+                for batch in _scheduleBatches(misses, batchSize)
+            ]
+            for future in waitlist:
+                future.result()
+    return [file.getHashes(algorithms) for file in files]
+
+
+def _hashPathBatch(
+    batch: List[Tuple[str, List[str]]], chunkSize: int, dropCache: bool = False
+) -> List[Tuple[Dict[str, str], int, int]]:
+    return [
+        _hashPath(path, algorithms, chunkSize, dropCache)
+        for path, algorithms in batch
+    ]
+
+
+def hashFilesInProcesses(
+    files: Iterable["File"],
+    algorithms: Sequence[str],
+    processes: Union[int, None] = None,
+    chunkSize: int = DEFAULT_CHUNK_SIZE,
+    batchSize: int = 16,
+    dropCache: bool = False,
+) -> List[Dict[str, str]]:
+    """
+    Calculates the hashes of many files with a process pool, so hashing is not limited by the GIL.
+
+    Only the paths are sent to the worker processes, scheduled like in `hashFiles`. The results are kept in the files (and their `hashCache`) in this process, just like `File.getHashes` does. No process is started if every hash is cached already.
+
+    Args:
+        files (Iterable[File]): The files to hash.
+        algorithms (Sequence[str]): The names of the hash algorithms, see `File.getHash`.
+        processes (Union[int, None], optional): The number of worker processes. Defaults to None, which means the number of CPUs.
+        chunkSize (int, optional): The size of each read. Defaults to DEFAULT_CHUNK_SIZE.
+        batchSize (int, optional): The number of files hashed by one task. Defaults to 16.
+        dropCache (bool, optional): Drop each file from the page cache after hashing it, see `hashFiles`. Defaults to False.
+
+    Returns:
+        List[Dict[str, str]]: The hashes of each file, in the order of `files`.
+    """
+    files = list(files)
+    _checkAlgorithms(algorithms)
+    misses: List[Tuple[File, List[str]]] = []
+    for file in files:
+        missing = file._missingHashes(algorithms)
+        if missing:
+            misses.append((file, missing))
+    if misses:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            waitlist = [
+                (
+                    batch,
+                    pool.submit(
+                        _hashPathBatch,
+                        [(file._pathStr, missing) for file, missing in batch],
+                        chunkSize,
+                        dropCache,
+                    ),
+                )
+                for batch in _scheduleBatches(misses, batchSize)
+            ]
+            for batch, future in waitlist:
+                for (file, _), result in zip(batch, future.result()):
+                    file._storeHashes(*result)
+    return [file.getHashes(algorithms) for file in files]
+
+
 def tryRun(fn: Callable[..., _U]) -> Union[_U, RuntimeError]:
     try:
         return fn()
@@ -86,6 +477,7 @@ def tryRun(fn: Callable[..., _U]) -> Union[_U, RuntimeError]:
 
 
 class _HasName(Generic[_T]):
+    __slots__ = ()
     name: str
 
 
@@ -307,13 +699,32 @@ class FileSystemNode(_HasName):
 
 
 class File(FileSystemNode):
-    def __init__(self, path: Union[str, Path], parent: Union["Folder", None] = None):
+    def __init__(
+        self,
+        path: Union[str, Path],
+        parent: Union["Folder", None] = None,
+        state: Union[os.stat_result, None] = None,
+        hashCache: Union[FileHashCacheManager, None] = None,
+    ):
+        """
+        Args:
+            path (Union[str, Path]): The path to the file.
+            parent (Union["Folder", None], optional): The parent folder. Defaults to None.
+            state (Union[os.stat_result, None], optional): An already fetched stat result of the file, saves one `os.stat` call. Defaults to None.
+            hashCache (Union[FileHashCacheManager, None], optional): A cache (e.g. `cache.SqliteFileHashCacheManager`) to keep calculated hashes in. Defaults to None.
+        """
         self._active = True
         if not isinstance(path, Path):
             path = Path(path)
         self.path = path
+        # plain str of the path, kept for the hash caches so they do not convert it on every lookup
+        # interned, so keys of the same file from different objects compare by identity
+        self._pathStr = sys.intern(str(path))
+        # held while hashing, so threads asking for the same hash do not read the file twice
+        self._hashLock = threading.Lock()
         self.parent = parent
-        self.refresh()
+        self.hashCache = hashCache
+        self.refresh(state)
 
     def deactivate(self):
         """
@@ -321,9 +732,25 @@ class File(FileSystemNode):
         """
         self._active = False
 
-    def refresh(self):
-        """Rebuild all of this file object"""
-        state = os.stat(self.path)
+    def __getstate__(self) -> Dict[str, Any]:
+        # locks cannot be pickled, the copy gets a new one
+        state = self.__dict__.copy()
+        del state["_hashLock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._hashLock = threading.Lock()
+
+    def refresh(self, state: Union[os.stat_result, None] = None):
+        """
+        Rebuild all of this file object. Calculated hashes are kept if the size, modification time and inode did not change.
+
+        Args:
+            state (Union[os.stat_result, None], optional): The stat result to rebuild from. It is fetched with `os.stat` if not given. Defaults to None.
+        """
+        if state is None:
+            state = os.stat(self.path)
         self.mode = state.st_mode
         self.ino = state.st_ino
         self.dev = state.st_dev
@@ -331,12 +758,14 @@ class File(FileSystemNode):
         self.gid = state.st_gid
         self.size = state.st_size
         self.mtime = state.st_mtime
+        self.mtimeNs = state.st_mtime_ns
         self.ctime = state.st_ctime
         self.atime = state.st_atime
-        self._md5: Union[None, str] = None
-        self._sha1: Union[None, str] = None
-        self._sha256: Union[None, str] = None
-        self._sha512: Union[None, str] = None
+        # keep the known hashes if the file cannot have changed since they were calculated
+        fingerprint = (state.st_size, state.st_mtime_ns, state.st_ino)
+        if getattr(self, "_fingerprint", None) != fingerprint:
+            self._hashes: Dict[str, str] = {}
+        self._fingerprint = fingerprint
 
     @property
     def name(self) -> str:
@@ -388,6 +817,143 @@ class File(FileSystemNode):
             f.write(content)
         f.flush()
 
+    def getHash(
+        self,
+        algorithm: str = DEFAULT_HASH_ALGORITHM,
+        chunkSize: int = DEFAULT_CHUNK_SIZE,
+        dropCache: bool = False,
+    ) -> str:
+        """
+        Returns the hash of the content calculated with the given algorithm.
+
+        Any algorithm of `hashlib` with a fixed digest length is accepted (not "shake_128" or "shake_256"). For change detection, where a cryptographic hash is not needed, "xxh3_64", "xxh3_128" (needs `xxhash`) and "blake3" (needs `blake3`) are several times faster per byte; keep "sha256" or "sha512" for integrity checks.
+
+        Args:
+            algorithm (str, optional): The name of the hash algorithm. Defaults to DEFAULT_HASH_ALGORITHM, the fastest algorithm on this machine: "blake3" if the `blake3` package is installed, otherwise "sha256" if the CPU has SHA extensions, otherwise "blake2b". Pass an algorithm explicitly if the hashes are compared across machines.
+            chunkSize (int, optional): The size of each read. hashlib only releases the GIL for large buffers, so big chunks let threaded hashing (e.g. a threaded compare) actually overlap. At least 64 KiB is used. It is rounded up to a multiple of the block size of the filesystem, and files smaller than it are read in one go. Files of MMAP_MIN_SIZE and more are memory-mapped instead of read, there it is only the window handed to each algorithm when several are calculated. Defaults to DEFAULT_CHUNK_SIZE (1 MiB).
+            dropCache (bool, optional): Ask the kernel to drop the file from the page cache after hashing, so scanning a huge tree once does not evict hotter data. Only has an effect where `os.posix_fadvise` exists. Defaults to False.
+
+        Returns:
+            str: The hexadecimal digest of the content.
+        """
+        cached = self._hashes.get(algorithm)
+        if cached is not None:
+            return cached
+        with self._hashLock:
+            # another thread may have hashed the file while this one waited
+            cached = self._hashes.get(algorithm)
+            if cached is not None:
+                return cached
+            path = self._pathStr
+            if self.hashCache:
+                cached = self.hashCache.get(path, algorithm, self.size, self.mtimeNs)
+                if cached is not None:
+                    self._hashes[algorithm] = cached
+                    return cached
+            hashes, size, mtimeNs = _hashPath(path, [algorithm], chunkSize, dropCache)
+            hash = self._hashes[algorithm] = hashes[algorithm]
+            if self.hashCache:
+                self.hashCache.set(path, algorithm, size, mtimeNs, hash)
+        return hash
+
+    async def getHashAsync(
+        self,
+        algorithm: str = DEFAULT_HASH_ALGORITHM,
+        chunkSize: int = DEFAULT_CHUNK_SIZE,
+        dropCache: bool = False,
+    ) -> str:
+        """
+        Returns the hash of the content like `getHash`, but reads and hashes the file in the default executor of the running event loop, so slow disks or network storage do not block it. Known hashes are returned without leaving the loop.
+
+        Args:
+            algorithm (str, optional): The name of the hash algorithm, see `getHash`. Defaults to DEFAULT_HASH_ALGORITHM.
+            chunkSize (int, optional): The size of each read, see `getHash`. Defaults to DEFAULT_CHUNK_SIZE.
+            dropCache (bool, optional): Drop the file from the page cache after hashing, see `getHash`. Defaults to False.
+
+        Returns:
+            str: The hexadecimal digest of the content.
+        """
+        cached = self._hashes.get(algorithm)
+        if cached is not None:
+            return cached
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.getHash, algorithm, chunkSize, dropCache
+        )
+
+    def getHashes(
+        self,
+        algorithms: Sequence[str],
+        chunkSize: int = DEFAULT_CHUNK_SIZE,
+        dropCache: bool = False,
+    ) -> Dict[str, str]:
+        """
+        Returns the hashes of the content calculated with several algorithms. The file is read only once for all algorithms that are not cached yet.
+
+        Args:
+            algorithms (Sequence[str]): The names of the hash algorithms, see `getHash`.
+            chunkSize (int, optional): The size of each read, see `getHash`. Defaults to DEFAULT_CHUNK_SIZE.
+            dropCache (bool, optional): Drop the file from the page cache after hashing, see `getHash`. Defaults to False.
+
+        Returns:
+            Dict[str, str]: The hexadecimal digests indexed by algorithm.
+        """
+        hashes = self._hashes
+        result: Dict[str, str] = {}
+        for algorithm in algorithms:
+            cached = hashes.get(algorithm)
+            if cached is None:
+                break
+            result[algorithm] = cached
+        else:
+            return result
+        self._calculateHashes(
+            [i for i in algorithms if i not in hashes], chunkSize, dropCache
+        )
+        return {i: hashes[i] for i in algorithms}
+
+    def _calculateHashes(
+        self, algorithms: List[str], chunkSize: int, dropCache: bool = False
+    ) -> None:
+        """
+        Calculates the hashes of the given algorithms in one pass over the file and keeps them in the caches. Hashes found in `hashCache` are not calculated again.
+
+        Args:
+            algorithms (List[str]): The names of the hash algorithms.
+            chunkSize (int): The size of each read.
+            dropCache (bool, optional): Drop the file from the page cache afterwards. Defaults to False.
+        """
+        with self._hashLock:
+            missing = self._missingHashes(algorithms)
+            if missing:
+                self._storeHashes(
+                    *_hashPath(self._pathStr, missing, chunkSize, dropCache)
+                )
+
+    def _missingHashes(self, algorithms: Iterable[str]) -> List[str]:
+        """
+        Returns the algorithms whose hashes are neither known by this object nor in `hashCache`. Hashes found in `hashCache` are kept in this object.
+        """
+        path = self._pathStr
+        missing: List[str] = []
+        for algorithm in algorithms:
+            if algorithm in self._hashes:
+                continue
+            if self.hashCache:
+                cached = self.hashCache.get(path, algorithm, self.size, self.mtimeNs)
+                if cached is not None:
+                    self._hashes[algorithm] = cached
+                    continue
+            missing.append(algorithm)
+        return missing
+
+    def _storeHashes(self, hashes: Dict[str, str], size: int, mtimeNs: int) -> None:
+        """
+        Keeps calculated hashes in this object and in `hashCache`. `hashCache` gets them under the size and modification time of the content that was hashed, not those of the scan.
+        """
+        self._hashes.update(hashes)
+        if self.hashCache:
+            self.hashCache.setMany(self._pathStr, size, mtimeNs, hashes)
+
     @property
     def md5(self) -> str:
         """
@@ -396,10 +962,7 @@ class File(FileSystemNode):
         :return: The MD5 hash as a string.
         :rtype: str
         """
-        if self._md5:
-            return self._md5
-        self._md5 = hashlib.md5(self.content).hexdigest()
-        return self._md5
+        return self.getHash("md5")
 
     @property
     def sha1(self) -> str:
@@ -409,10 +972,7 @@ class File(FileSystemNode):
         :return: A string representing the SHA-1 hash value.
         :rtype: str
         """
-        if self._sha1:
-            return self._sha1
-        self._sha1 = hashlib.sha1(self.content).hexdigest()
-        return self._sha1
+        return self.getHash("sha1")
 
     @property
     def sha256(self) -> str:
@@ -422,10 +982,7 @@ class File(FileSystemNode):
         :return: A string representing the SHA-256 hash.
         :rtype: str
         """
-        if self._sha256:
-            return self._sha256
-        self._sha256 = hashlib.sha256(self.content).hexdigest()
-        return self._sha256
+        return self.getHash("sha256")
 
     @property
     def sha512(self) -> str:
@@ -435,20 +992,17 @@ class File(FileSystemNode):
         Returns:
             str: The SHA512 hash of the content.
         """
-        if self._sha512:
-            return self._sha512
-        self._sha512 = hashlib.sha512(self.content).hexdigest()
-        return self._sha512
+        return self.getHash("sha512")
 
     @property
     def hash(self) -> str:
         """
-        Returns the hash value of the object.
+        Returns the hash value of the content, calculated with DEFAULT_HASH_ALGORITHM.
 
         :return: A string representing the hash value.
         :rtype: str
         """
-        return self.md5
+        return self.getHash(DEFAULT_HASH_ALGORITHM)
 
     def remove(self):
         """
@@ -508,7 +1062,8 @@ class File(FileSystemNode):
             self.parent._updateRenameSubItem(self.name, newName)
 
     def __getattribute__(self, __name: str) -> Any:
-        if not super().__getattribute__("_active") and __name not in [
+        # _active is missing while unpickling, until the state is restored
+        if not super().__getattribute__("__dict__").get("_active", True) and __name not in [
             "_active",
             "path",
             "parent",
@@ -520,6 +1075,28 @@ class File(FileSystemNode):
         return super().__getattribute__(__name)
 
 
+_toDictIncludeFiles: Dict[str, Callable[[File], Any]] = {
+    "base64": lambda x: {
+        "name": x.name,
+        "base64": base64.b64encode(x.content).decode(),
+    },
+    "info": lambda x: {
+        "name": x.name,
+        "size": x.size,
+        "dev": x.dev,
+        "uid": x.uid,
+        "gid": x.gid,
+        "ctime": x.ctime,
+        "atime": x.atime,
+        "mtime": x.mtime,
+        "ino": x.ino,
+        "mode": x.mode,
+    },
+    "bytes": lambda x: {"name": x.name, "bytes": x.content},
+    "keep": lambda x: x,
+}
+
+
 class Folder(FileSystemNode):
     def __init__(
         self,
@@ -529,6 +1106,7 @@ class Folder(FileSystemNode):
         scan: bool = False,
         ignores: Iterable[Union[str, Path]] = [],
         gitignore: bool = False,
+        hashCache: Union[FileHashCacheManager, None] = None,
     ):
         """
         Args:
@@ -538,6 +1116,7 @@ class Folder(FileSystemNode):
             scan (bool, optional): Indicates whether to scan the directory contents. Defaults to False.
             ignores (Iterable[Union[str, Path]], optional): A list of paths to ignore. Defaults to [].
             gitignore (bool, optional): Indicates whether to use the .gitignore file. Defaults to False.
+            hashCache (Union[FileHashCacheManager, None], optional): The hash cache shared by all files in the folder. Defaults to None.
         """
         self._active = True
         if not isinstance(path, Path):
@@ -547,6 +1126,7 @@ class Folder(FileSystemNode):
         self.parent = parent
         self.scaned = scan
         self.gitignore = gitignore
+        self.hashCache = hashCache
         self.ignores: List[Path] = []
         self.scan = scan
         self.logger = logging.getLogger(self.name)
@@ -580,30 +1160,42 @@ class Folder(FileSystemNode):
         self.logger.debug("refresh folder contents")
         """Rebuild all of this folder object"""
         self.scaned = True
-        self.dir: List[str] = os.listdir(self.path)
+        with os.scandir(self.path) as it:
+            entries = list(it)
+        self.dir: List[str] = [i.name for i in entries]
         self.files: FileList = FileList([])
         self.subfolder: FolderList = FolderList([])
-        for i in self.dir:
-            newPath = self.path.add(i)
+        for i in entries:
+            newPath = self.path.add(i.name)
             if newPath in self.ignores:
                 continue
-            if os.path.isfile(newPath):
-                self.files.append(self._newFile(newPath))
-            elif os.path.isdir(newPath):
+            try:
+                isFile = i.is_file()
+                isDir = not isFile and i.is_dir()
+                # DirEntry.stat() leaves st_ino and st_dev zero on Windows, File.refresh stats it there
+                state = i.stat() if isFile and os.name != "nt" else None
+            except OSError:
+                continue  # removed while scanning
+            if isFile:
+                self.files.append(self._newFile(newPath, state))
+            elif isDir:
                 self.subfolder.append(self._newSubFolder(newPath))
 
-    def _newFile(self, path: Path) -> File:
+    def _newFile(
+        self, path: Path, state: Union[os.stat_result, None] = None
+    ) -> File:
         """
         Creates a new File object with the given path and adds it to the current directory.
 
         Args:
             path (Path): The path of the file to be created.
+            state (Union[os.stat_result, None], optional): The stat result of the file if it is already known. Defaults to None.
 
         Returns:
             File: The newly created File object.
 
         """
-        return File(path, parent=self)
+        return File(path, parent=self, state=state, hashCache=self.hashCache)
 
     def _newSubFolder(self, path: Path) -> "Folder":
         """
@@ -621,6 +1213,7 @@ class Folder(FileSystemNode):
             scan=self.scan,
             ignores=self.ignores,
             gitignore=self.gitignore,
+            hashCache=self.hashCache,
         )
 
     @property
@@ -702,6 +1295,12 @@ class Folder(FileSystemNode):
             target = self[name]
             if isinstance(target, Folder):
                 target.refresh()
+            elif isinstance(target, File):
+                # re-stat it, so the known hashes are dropped as soon as the content changes
+                try:
+                    target.refresh()
+                except FileNotFoundError:
+                    pass  # removed meanwhile, the deleted event follows
 
     def __getattribute__(self, name: str) -> Any:
         if not super().__getattribute__("_active") and name not in [
@@ -946,9 +1545,9 @@ class Folder(FileSystemNode):
             pool=threadPool,
             waitlist=waitlist,
         )
+        # the list grows while subfolders are dispatched, so it is walked instead of passed to wait()
         for i in waitlist:
-            while not i.done():
-                time.sleep(0.1)
+            i.result()
         return retsult
 
     def _match(
@@ -1162,28 +1761,8 @@ class Folder(FileSystemNode):
     ) -> Callable[[File], Any]:
         if callable(includeFiles):
             return includeFiles
-        ma: Dict[str, Callable[[File], Any]] = {
-            "base64": lambda x: {
-                "name": x.name,
-                "base64": base64.b64encode(x.content).decode(),
-            },
-            "info": lambda x: {
-                "name": x.name,
-                "size": x.size,
-                "dev": x.dev,
-                "uid": x.uid,
-                "gid": x.gid,
-                "ctime": x.ctime,
-                "atime": x.atime,
-                "mtime": x.mtime,
-                "ino": x.ino,
-                "mode": x.mode,
-            },
-            "bytes": lambda x: {"name": x.name, "bytes": x.content},
-            "keep": lambda x: x,
-        }
-        if includeFiles in ma:
-            return ma[includeFiles]
+        if includeFiles in _toDictIncludeFiles:
+            return _toDictIncludeFiles[includeFiles]
         raise ValueError(f"Invalid value for includeFiles: {includeFiles}")
 
     def toDict(
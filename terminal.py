@@ -47,6 +47,10 @@ def doCompare(commandArgs: Union[List[str], None] = None):
             "sha1",
             "sha256",
             "sha512",
+            "blake2b",
+            "xxh3_64",
+            "xxh3_128",
+            "blake3",
             "hash",
             "content",
             "size",
@@ -58,7 +62,11 @@ def doCompare(commandArgs: Union[List[str], None] = None):
         "-t", "--threaded", action="store_true", help="Use multithreaded scanning"
     )
     argparser.add_argument(
-        "-n", "--num", type=int, default=10, help="Maximum number of threads"
+        "-n",
+        "--num",
+        type=int,
+        default=None,
+        help="Maximum number of threads, defaults to 2 on a spinning disk, otherwise the number of CPUs",
     )
     args = argparser.parse_args(commandArgs)
     folder1 = doFolder.Folder(args.folder1)